@@ -0,0 +1,145 @@
+# metadata_store.py
+import json
+import sqlite3
+from pathlib import Path
+from collections.abc import MutableMapping
+
+# orjson for fast per-entry (de)serialization (falls back to json)
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except Exception:
+    ORJSON_AVAILABLE = False
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS contracts(
+    cid TEXT PRIMARY KEY,
+    hash TEXT,
+    mtime_ns INTEGER,
+    size INTEGER,
+    file_path TEXT,
+    version INTEGER,
+    status TEXT,
+    info_json TEXT
+)
+"""
+
+def _dumps(obj):
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False)
+
+def _loads(s):
+    if ORJSON_AVAILABLE:
+        return orjson.loads(s)
+    return json.loads(s)
+
+class MetadataStore(MutableMapping):
+    """
+    Dict-like view over the contracts table: {contract_id: metadata entry}.
+    Entries are decoded lazily on first access. save() only serializes and writes rows that were
+    assigned or deleted since the last save, so its cost follows the number of changed contracts,
+    not the size of the DB. Like shelve without writeback, an in-place edit (entry["hash"] = ...)
+    is only persisted once the entry is assigned back: store[cid] = entry.
+    """
+
+    def __init__(self, path: Path, legacy_json: Path = None):
+        self.path = Path(path)
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+        self._cache = {}    # cid -> materialized entry
+        self._dirty = set()
+        self._deleted = set()
+        # keep insertion order like the JSON DB did
+        self._keys = dict.fromkeys(r[0] for r in self.conn.execute("SELECT cid FROM contracts ORDER BY rowid"))
+        if not self._keys and legacy_json is not None and Path(legacy_json).exists():
+            self._import_json(Path(legacy_json))
+
+    def _import_json(self, json_path: Path):
+        try:
+            data = _loads(json_path.read_bytes())
+        except Exception:
+            return
+        for cid, info in data.items():
+            self[cid] = info
+        self.save()
+
+    # --- mapping protocol ---
+    def __getitem__(self, cid):
+        if cid in self._cache:
+            return self._cache[cid]
+        if cid not in self._keys:
+            raise KeyError(cid)
+        row = self.conn.execute("SELECT info_json FROM contracts WHERE cid=?", (cid,)).fetchone()
+        info = _loads(row[0]) if row and row[0] else {}
+        self._cache[cid] = info
+        return info
+
+    def __setitem__(self, cid, info):
+        self._cache[cid] = info
+        self._keys[cid] = None
+        self._dirty.add(cid)
+        self._deleted.discard(cid)
+
+    def __delitem__(self, cid):
+        if cid not in self._keys:
+            raise KeyError(cid)
+        del self._keys[cid]
+        self._cache.pop(cid, None)
+        self._dirty.discard(cid)
+        self._deleted.add(cid)
+
+    def __iter__(self):
+        return iter(list(self._keys))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, cid):
+        return cid in self._keys
+
+    # --- persistence ---
+    def save(self):
+        rows = []
+        for cid in self._dirty:
+            info = self._cache[cid]
+            rows.append((cid, info.get("hash"), info.get("mtime_ns"), info.get("size"), info.get("file_path"),
+                         info.get("version"), info.get("status"), _dumps(info)))
+        with self.conn:
+            if self._deleted:
+                self.conn.executemany("DELETE FROM contracts WHERE cid=?", [(cid,) for cid in self._deleted])
+            if rows:
+                self.conn.executemany(
+                    "INSERT INTO contracts(cid, hash, mtime_ns, size, file_path, version, status, info_json) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(cid) DO UPDATE SET hash=excluded.hash, mtime_ns=excluded.mtime_ns, size=excluded.size, "
+                    "file_path=excluded.file_path, version=excluded.version, status=excluded.status, info_json=excluded.info_json",
+                    rows)
+        self._dirty.clear()
+        self._deleted.clear()
+        return len(rows)
+
+    def replace_all(self, db: dict):
+        """Make the table mirror a plain dict (entries missing from db are deleted)."""
+        for cid in list(self._keys):
+            if cid not in db:
+                del self[cid]
+        for cid, info in db.items():
+            self[cid] = info
+        return self.save()
+
+    def to_dict(self):
+        return {cid: self[cid] for cid in self}
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
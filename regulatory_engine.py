@@ -1,8 +1,18 @@
 # regulatory_engine.py
 import json
+import mmap
 from pathlib import Path
 from datetime import datetime
-from utils import read_text_from_file, ensure_dirs, save_metadata_db, REG_UPDATES_DIR, METADATA_DB, register_contract_entry, apply_amendment_file, save_text_as_pdf_or_txt
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from utils import read_text_from_file, clear_text_cache, compute_file_hash, ensure_dirs, save_metadata_db, REG_UPDATES_DIR, METADATA_DB, register_contract_entry, apply_amendment_file, save_text_as_pdf_or_txt
+
+# Aho-Corasick keyword automaton (optional; falls back to per-keyword substring tests)
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except Exception:
+    AHOCORASICK_AVAILABLE = False
 
 # local config
 REG_DB_FILE = Path("regulatory_db.json")
@@ -26,6 +36,54 @@ DEMO_REGS = [
     }
 ]
 
+# draft clause templates: (trigger substring of a matched keyword, clause line), in output order
+_CONSENT_CLAUSE = "- Consent recordkeeping: The parties shall obtain explicit consent and retain timestamp and purpose of consent for audit purposes."
+_LOCALISATION_CLAUSE = "- Data localisation: Certain personal data must be stored within the jurisdiction and transferred only under documented safeguards."
+_PRIVACY_CLAUSE = "- Privacy notice: Update privacy notice to include profiling logic and legal basis for processing."
+_CLAUSE_TRIGGERS = [
+    ("consent", _CONSENT_CLAUSE),
+    ("localis", _LOCALISATION_CLAUSE),
+    ("local", _LOCALISATION_CLAUSE),
+    ("privacy", _PRIVACY_CLAUSE),
+    ("notice", _PRIVACY_CLAUSE),
+]
+
+# .txt contracts above this size are keyword-scanned through mmap instead of being decoded to str
+MMAP_SCAN_THRESHOLD = 4 * (1 << 20)
+MMAP_SCAN_WINDOW = 16 * (1 << 20)
+
+def _scan_keywords_mmap(path: Path, kw_bytes_list, first_only: bool = False):
+    """
+    Count occurrences of each (lowercase, ASCII) keyword in a file without decoding it.
+    The file is mapped read-only and scanned in overlapping windows lowercased with bytes.lower(),
+    so matching stays case-insensitive; only matches starting inside a window's own span are counted.
+    With first_only, counts are capped at 1: a keyword is dropped once found and the scan stops
+    as soon as every keyword has been seen.
+    """
+    counts = {kw: 0 for kw in kw_bytes_list}
+    kws = [kw for kw in kw_bytes_list if kw]
+    if not kws:
+        return counts
+    overlap = max(len(kw) for kw in kws) - 1
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        for start in range(0, size, MMAP_SCAN_WINDOW):
+            if not kws:
+                break
+            span = min(MMAP_SCAN_WINDOW, size - start)
+            window = mm[start:min(start + span + overlap, size)].lower()
+            for kw in list(kws):
+                pos = window.find(kw)
+                if first_only:
+                    if pos != -1 and pos < span:
+                        counts[kw] = 1
+                        kws.remove(kw)
+                    continue
+                while pos != -1 and pos < span:
+                    counts[kw] += 1
+                    pos = window.find(kw, pos + 1)
+    return counts
+
 def ensure_reg_db():
     if not REG_DB_FILE.exists():
         REG_DB_FILE.write_text(json.dumps(DEMO_REGS, indent=2, ensure_ascii=False), encoding="utf-8")
@@ -38,6 +96,10 @@ class RegulatoryEngine:
         self.updates_dir.mkdir(parents=True, exist_ok=True)
         # load regs into memory
         self.regs = self.load_reg_db()
+        self._build_keyword_matcher()
+        # background amendment PDF writer, active only during run_full_cycle
+        self._pdf_pool = None
+        self._pdf_futures = []
 
     def load_reg_db(self):
         try:
@@ -53,16 +115,84 @@ class RegulatoryEngine:
         regs = self.load_reg_db()
         return regs
 
-    def _keyword_score(self, reg_keywords, text):
-        if not text:
-            return 0
-        t = text.lower()
-        hits = 0
-        for kw in reg_keywords:
-            if kw.lower() in t:
-                hits += 1
+    def _build_keyword_matcher(self):
+        """
+        Build one Aho-Corasick automaton over the keywords of every reg in self.regs,
+        so each contract text is scanned once per cycle instead of once per (reg, keyword).
+        Also precomputes each reg's lowercased keywords and the distinct keywords across all regs.
+        """
+        self._kw_lower = {r.get("id"): [kw.lower() for kw in r.get("keywords", [])] for r in self.regs}
+        # regs often share keywords ("personal data"); the substring fallback searches each one once
+        self._kw_distinct = tuple(dict.fromkeys(kw for kws in self._kw_lower.values() for kw in kws if kw))
+        # bytes.lower() only folds ASCII, so the mmap scan is used only when it agrees with str.lower()
+        self._kw_ascii = all(kw.isascii() for kws in self._kw_lower.values() for kw in kws)
+        self._ac = None
+        if not AHOCORASICK_AVAILABLE:
+            return
+        owners = defaultdict(list)
+        for r in self.regs:
+            for kw, kw_lower in zip(r.get("keywords", []), self._kw_lower[r.get("id")]):
+                if kw:
+                    owners[kw_lower].append((r.get("id"), kw))
+        if not owners:
+            return
+        self._ac = ahocorasick.Automaton()
+        for kw_lower, hits in owners.items():
+            self._ac.add_word(kw_lower, tuple(hits))
+        self._ac.make_automaton()
+
+    def _reg_keywords_lower(self, reg):
+        kws = self._kw_lower.get(reg.get("id"))
+        if kws is None:
+            kws = [kw.lower() for kw in reg.get("keywords", [])]
+        return kws
+
+    def _match_keywords(self, text_lower):
+        """Return {reg_id: [matched keywords]} for all regs, in each reg's keyword order."""
+        found = defaultdict(set)
+        if self._ac is not None:
+            for _, hits in self._ac.iter(text_lower):
+                for rid, kw in hits:
+                    found[rid].add(kw)
+        else:
+            present = {kw_lower for kw_lower in self._kw_distinct if kw_lower in text_lower}
+            if present:
+                for r in self.regs:
+                    for kw, kw_lower in zip(r.get("keywords", []), self._reg_keywords_lower(r)):
+                        if kw_lower in present:
+                            found[r.get("id")].add(kw)
+        matches = defaultdict(list)
+        for r in self.regs:
+            rid = r.get("id")
+            if rid in found:
+                matches[rid] = [kw for kw in r.get("keywords", []) if kw in found[rid]]
+        return matches
+
+    def _match_keywords_mmap(self, path: Path):
+        """Same result as _match_keywords, computed from the raw bytes of a large .txt contract."""
+        kw_bytes = {kw_lower.encode("utf-8") for kws in self._kw_lower.values() for kw_lower in kws}
+        counts = _scan_keywords_mmap(path, list(kw_bytes), first_only=True)
+        matches = defaultdict(list)
+        for r in self.regs:
+            hit = [kw for kw, kw_lower in zip(r.get("keywords", []), self._reg_keywords_lower(r))
+                   if counts.get(kw_lower.encode("utf-8"))]
+            if hit:
+                matches[r.get("id")] = hit
+        return matches
+
+    def _keyword_score(self, reg_keywords, text_lower, matches=None):
+        # reg_keywords and text_lower are expected to be lowercased already
         if not reg_keywords:
             return 0
+        if matches is not None:
+            hits = len(matches)
+        else:
+            if not text_lower:
+                return 0
+            hits = 0
+            for kw in reg_keywords:
+                if kw in text_lower:
+                    hits += 1
         return int((hits / len(reg_keywords)) * 100)
 
     def _jurisdiction_boost(self, reg_jur, contract_jur):
@@ -76,8 +206,10 @@ class RegulatoryEngine:
             return 30
         return 0
 
-    def compute_risk(self, reg, contract_meta, contract_text):
-        kw_score = self._keyword_score(reg.get("keywords", []), contract_text)
+    def compute_risk(self, reg, contract_meta, contract_text, matches=None):
+        # matches: keywords already found in contract_text (skips the text scan)
+        text_lower = (contract_text or "").lower() if matches is None else None
+        kw_score = self._keyword_score(self._reg_keywords_lower(reg), text_lower, matches)
         jur_boost = self._jurisdiction_boost(reg.get("jurisdiction", ""), contract_meta.get("jurisdiction", ""))
         # age penalty (minor)
         age_penalty = 0
@@ -105,13 +237,15 @@ class RegulatoryEngine:
         lines.append(", ".join(matches) if matches else "None")
         lines.append("")
         lines.append("Suggested (draft) clause language:")
-        # templated examples
-        if any("consent" in (m or "").lower() for m in matches):
-            lines.append("- Consent recordkeeping: The parties shall obtain explicit consent and retain timestamp and purpose of consent for audit purposes.")
-        if any("localis" in (m or "").lower() or "local" in (m or "").lower() for m in matches):
-            lines.append("- Data localisation: Certain personal data must be stored within the jurisdiction and transferred only under documented safeguards.")
-        if any("privacy" in (m or "").lower() or "notice" in (m or "").lower() for m in matches):
-            lines.append("- Privacy notice: Update privacy notice to include profiling logic and legal basis for processing.")
+        # templated examples: lowercase each match once, emit each clause at most once
+        matches_lower = [m.lower() for m in matches if m]
+        emitted = set()
+        for trigger, snippet in _CLAUSE_TRIGGERS:
+            if snippet in emitted:
+                continue
+            if any(trigger in m for m in matches_lower):
+                lines.append(snippet)
+                emitted.add(snippet)
         if not matches:
             lines.append("- General recommendation: review contract for personal data handling and add explicit responsibilities.")
         lines.append("")
@@ -124,9 +258,23 @@ class RegulatoryEngine:
         txt_path = self.updates_dir / f"{base}.txt"
         pdf_path = self.updates_dir / f"{base}.pdf"
         txt_path.write_text(amendment_text, encoding="utf-8")
-        save_text_as_pdf_or_txt(amendment_text, pdf_path)
+        if self._pdf_pool is not None:
+            self._pdf_futures.append(self._pdf_pool.submit(save_text_as_pdf_or_txt, amendment_text, pdf_path))
+        else:
+            save_text_as_pdf_or_txt(amendment_text, pdf_path)
         return {"txt": str(txt_path), "pdf": str(pdf_path)}
 
+    def _finish_pdf_writes(self):
+        """Wait for queued amendment PDFs and shut the writer pool down (re-raises write errors)."""
+        if self._pdf_pool is None:
+            return
+        futures, self._pdf_futures = self._pdf_futures, []
+        wait(futures)
+        self._pdf_pool.shutdown()
+        self._pdf_pool = None
+        for f in futures:
+            f.result()
+
     def run_full_cycle(self, metadata: dict, auto_apply_threshold: int = 90):
         """
         For every regulation and contract in metadata, compute risk and create amendment suggestions
@@ -134,64 +282,95 @@ class RegulatoryEngine:
         the amendment will be automatically applied (dangerous in prod — demo only).
         """
         regs = self.fetch_regulatory_updates()
+        if regs != self.regs:
+            self.regs = regs
+            self._build_keyword_matcher()
         proposals = []
-        for reg in regs:
+        self._pdf_pool = ThreadPoolExecutor(max_workers=2)
+        try:
+            # contracts outer, regs inner: each contract is read and keyword-scanned once per cycle
             for cid, info in list(metadata.items()):
                 if "Archived" in info.get("status", ""):
                     continue
-                fp = info.get("file_path")
-                if not fp:
+                if not info.get("file_path"):
                     continue
-                text = read_text_from_file(Path(fp)) or ""
-                # find keyword matches
-                kw_matches = []
-                for kw in reg.get("keywords", []):
-                    if kw.lower() in (text or "").lower():
-                        kw_matches.append(kw)
-                risk = self.compute_risk(reg, info, text)
-                # threshold for suggestion (configurable) - here we pick >=40
-                if risk >= 40:
-                    amendment = self.generate_amendment_text(reg, kw_matches, info)
-                    saved = self.save_amendment(cid, reg, amendment)
-                    prop = {
-                        "contract_id": cid,
-                        "reg_id": reg.get("id"),
-                        "risk": risk,
-                        "matches": kw_matches,
-                        "amendment_txt": saved.get("txt"),
-                        "amendment_pdf": saved.get("pdf"),
-                        "timestamp": datetime.utcnow().isoformat()
-                    }
-                    proposals.append(prop)
-                    # attach proposal to metadata
-                    prop_meta = info.get("regulatory_proposals", [])
-                    prop_meta.append({**prop, "status": "suggested"})
-                    info["regulatory_proposals"] = prop_meta
-                    # simple regulatory_status label
-                    if risk >= 75:
-                        info["regulatory_status"] = "High Risk"
-                    elif risk >= 50:
-                        info["regulatory_status"] = "Needs Update"
+                # per-reg keyword matches from earlier cycles: {reg_id: {"hash", "keywords", "matches"}}
+                risk_cache = info.setdefault("risk_cache", {})
+                # only entries this cycle changes are handed back to the store, so saving stays incremental
+                changed = False
+                statuses = (info.get("regulatory_status"), info.get("age_status"))
+                fp = None
+                for reg in regs:
+                    if info["file_path"] != fp:
+                        # first reg, or an auto-applied amendment replaced the file: text is read lazily below
+                        fp = info["file_path"]
+                        file_hash = compute_file_hash(Path(fp), info)
+                        kw_hits = None
+                    rid = reg.get("id")
+                    cached = risk_cache.get(rid)
+                    if file_hash and cached and cached.get("hash") == file_hash and cached.get("keywords") == reg.get("keywords", []):
+                        # unchanged contract and reg keywords: reuse matches, skip the parse and scan
+                        kw_matches = cached["matches"]
                     else:
-                        info["regulatory_status"] = "Monitor"
-
-                    # Auto-apply if contract metadata says so AND very high risk
-                    if info.get("auto_apply") and risk >= auto_apply_threshold:
-                        try:
-                            apply_result = apply_amendment_file(info["file_path"], amendment, metadata)
-                            # update metadata with applied info
-                            info["file_path"] = apply_result["new_file"]
-                            info["version"] = apply_result["version"]
-                            info.setdefault("applied_amendments", []).append({
-                                "reg_id": reg.get("id"),
-                                "applied_at": datetime.utcnow().isoformat(),
-                                "details": apply_result
-                            })
-                        except Exception as e:
-                            info.setdefault("apply_errors", []).append(str(e))
-                else:
-                    # keep/mark OK
-                    info["regulatory_status"] = info.get("regulatory_status", "OK")
+                        if kw_hits is None and self._kw_ascii and Path(fp).suffix.lower() == ".txt" \
+                                and Path(fp).exists() and Path(fp).stat().st_size > MMAP_SCAN_THRESHOLD:
+                            # very large text contract: scan bytes in place instead of decoding to str
+                            kw_hits = self._match_keywords_mmap(Path(fp))
+                        if kw_hits is None:
+                            # uncached read: the text is needed once, and the LRU would keep it alive all cycle
+                            text_lower = (read_text_from_file(Path(fp), cache=False) or "").lower()
+                            # keyword hits for all regs at once: {reg_id: [kw, ...]}
+                            kw_hits = self._match_keywords(text_lower)
+                            # only the hits are needed from here on: don't hold the text across regs
+                            del text_lower
+                        kw_matches = kw_hits.get(rid, [])
+                        if file_hash:
+                            risk_cache[rid] = {"hash": file_hash, "keywords": reg.get("keywords", []), "matches": kw_matches}
+                            changed = True
+                    # jurisdiction and age can change without the file changing, so risk itself is recomputed
+                    risk = self.compute_risk(reg, info, None, kw_matches)
+                    # threshold for suggestion (configurable) - here we pick >=40
+                    if risk >= 40:
+                        amendment = self.generate_amendment_text(reg, kw_matches, info)
+                        saved = self.save_amendment(cid, reg, amendment)
+                        prop = {
+                            "contract_id": cid,
+                            "reg_id": reg.get("id"),
+                            "risk": risk,
+                            "matches": kw_matches,
+                            "amendment_txt": saved.get("txt"),
+                            "amendment_pdf": saved.get("pdf"),
+                            "timestamp": datetime.utcnow().isoformat()
+                        }
+                        proposals.append(prop)
+                        changed = True
+                        # attach proposal to metadata
+                        info.setdefault("regulatory_proposals", []).append({**prop, "status": "suggested"})
+                        # simple regulatory_status label
+                        if risk >= 75:
+                            info["regulatory_status"] = "High Risk"
+                        elif risk >= 50:
+                            info["regulatory_status"] = "Needs Update"
+                        else:
+                            info["regulatory_status"] = "Monitor"
+
+                        # Auto-apply if contract metadata says so AND very high risk
+                        if info.get("auto_apply") and risk >= auto_apply_threshold:
+                            try:
+                                apply_result = apply_amendment_file(info["file_path"], amendment, metadata)
+                                # update metadata with applied info
+                                info["file_path"] = apply_result["new_file"]
+                                info["version"] = apply_result["version"]
+                                info.setdefault("applied_amendments", []).append({
+                                    "reg_id": reg.get("id"),
+                                    "applied_at": datetime.utcnow().isoformat(),
+                                    "details": apply_result
+                                })
+                            except Exception as e:
+                                info.setdefault("apply_errors", []).append(str(e))
+                    else:
+                        # keep/mark OK
+                        info.setdefault("regulatory_status", "OK")
                 # update age_status info
                 last_up = info.get("last_updated") or info.get("date")
                 if last_up:
@@ -208,7 +387,14 @@ class RegulatoryEngine:
                             info["age_status"] = "6+ years"
                     except Exception:
                         info["age_status"] = "Unknown"
-                metadata[cid] = info
+                if changed or statuses != (info.get("regulatory_status"), info.get("age_status")):
+                    metadata[cid] = info
+        finally:
+            # also on error, so no queued write outlives the cycle
+            self._finish_pdf_writes()
+
+        # bound memory: drop texts memoized during this cycle
+        clear_text_cache()
 
         # persist a proposals log for visibility
         proposals_log = self.updates_dir / f"proposals_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.json"
@@ -1,11 +1,25 @@
 # utils.py
 import os
 import json
+import mmap
+import shutil
 import hashlib
+import re
+import difflib
+from contextlib import nullcontext
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime
+from metadata_store import MetadataStore
 
 # Optional imports (wrapped so code will still run if they are missing)
+# pypdfium2 (PDFium, C++) is preferred for text extraction; PyPDF2 is the pure-Python fallback
+try:
+    import pypdfium2 as pdfium
+    PDFIUM_AVAILABLE = True
+except Exception:
+    PDFIUM_AVAILABLE = False
+
 try:
     from PyPDF2 import PdfReader
 except Exception:
@@ -21,6 +35,34 @@ try:
 except Exception:
     FAISS_AVAILABLE = False
 
+# orjson for fast metadata DB (de)serialization (falls back to json)
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except Exception:
+    ORJSON_AVAILABLE = False
+
+# fasteners for an inter-process lock around metadata DB writes
+try:
+    import fasteners
+    FASTENERS_AVAILABLE = True
+except Exception:
+    FASTENERS_AVAILABLE = False
+
+# blake3 for fast file fingerprints (falls back to hashlib.blake2b)
+try:
+    import blake3
+    BLAKE3_AVAILABLE = True
+except Exception:
+    BLAKE3_AVAILABLE = False
+
+# xxhash for line fingerprints in clause diffs (falls back to built-in hash)
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except Exception:
+    XXHASH_AVAILABLE = False
+
 # reportlab for PDFs
 try:
     from reportlab.lib.pagesizes import A4
@@ -38,8 +80,12 @@ UPDATES_DIR = DATA_DIR / "updates"
 ARCHIVE_DIR = DATA_DIR / "archive"
 APPLIED_DIR = DATA_DIR / "applied"
 REG_UPDATES_DIR = DATA_DIR / "reg_updates"
-METADATA_DB = DATA_DIR / "metadata_db.json"
+METADATA_DB = DATA_DIR / "metadata_db.sqlite"
+METADATA_JSON = DATA_DIR / "metadata_db.json"  # legacy format; imported on first run, still available as export
 FAISS_INDEX_DIR = DATA_DIR / "faiss_index"
+TEXT_CACHE_DIR = DATA_DIR / ".text_cache"
+TEXT_CACHE_MAX_AGE_DAYS = 7
+_text_cache_swept = False  # sweep_text_cache runs once per process
 
 # -----------------------------
 # Helpers / IO
@@ -51,19 +97,65 @@ def ensure_dirs():
     APPLIED_DIR.mkdir(parents=True, exist_ok=True)
     REG_UPDATES_DIR.mkdir(parents=True, exist_ok=True)
     FAISS_INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    TEXT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    global _text_cache_swept
+    if not _text_cache_swept:
+        # periodic, not per call: ensure_dirs runs on every menu action
+        sweep_text_cache()
+        _text_cache_swept = True
+
+def _metadata_lock(path: Path):
+    if not FASTENERS_AVAILABLE:
+        return nullcontext()
+    return fasteners.InterProcessLock(str(path) + ".lock")
 
 def load_metadata_db(path: Path = METADATA_DB):
+    """
+    Return the metadata DB as a dict-like {contract_id: entry}.
+    The default SQLite store is backed by MetadataStore; a .json path loads the legacy JSON file into a plain dict.
+    """
+    path = Path(path)
+    if path.suffix.lower() != ".json":
+        return MetadataStore(path, legacy_json=METADATA_JSON)
     if not path.exists():
         return {}
     try:
+        if ORJSON_AVAILABLE:
+            return orjson.loads(path.read_bytes())
         with open(path, "r", encoding="utf-8") as f:
             return json.load(f)
     except Exception:
         return {}
 
 def save_metadata_db(db: dict, path: Path = METADATA_DB):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(db, f, indent=2, ensure_ascii=False)
+    """
+    Persist the metadata DB.
+    SQLite: a MetadataStore only writes the entries that changed; a plain dict replaces the table contents.
+    JSON: written atomically (temp file + os.replace) so a crash mid-write never leaves a truncated DB;
+    concurrent writers are serialized by a lock file.
+    """
+    path = Path(path)
+    if path.suffix.lower() != ".json":
+        if isinstance(db, MetadataStore) and db.path.resolve() == path.resolve():
+            db.save()
+        else:
+            store = MetadataStore(path)
+            store.replace_all(dict(db.items()))
+            store.close()
+        return
+    _write_metadata_json(db, path)
+
+def _write_metadata_json(db, path: Path):
+    """Write the metadata DB as JSON to path, whatever its suffix (atomic, lock-serialized)."""
+    path = Path(path)
+    if ORJSON_AVAILABLE:
+        data = orjson.dumps(dict(db.items()), option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    else:
+        data = json.dumps(dict(db.items()), indent=2, ensure_ascii=False).encode("utf-8")
+    tmp = path.with_name(path.name + ".tmp")
+    with _metadata_lock(path):
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
 
 # -----------------------------
 # File listing and reading
@@ -75,23 +167,64 @@ def find_files(folder: Path, extensions=None):
     files = [p for p in folder.rglob("*") if p.suffix.lower() in extensions]
     return files
 
-def read_text_from_file(file_path: Path):
+def read_text_from_file(file_path: Path, cache: bool = True):
+    """
+    Extract a contract's text. With cache=False the in-memory LRU is bypassed (the on-disk PDF
+    text cache is still used), for callers that read each file once and must not pin its text.
+    """
     file_path = Path(file_path)
     if not file_path.exists():
         return ""
+    st = os.stat(file_path)
+    read = _read_text_cached if cache else _read_text_cached.__wrapped__
+    return read(str(file_path), st.st_mtime_ns, st.st_size)
+
+def clear_text_cache():
+    _read_text_cached.cache_clear()
+
+def sweep_text_cache(max_age_days: int = TEXT_CACHE_MAX_AGE_DAYS):
+    """Delete on-disk text cache entries not used for max_age_days (hits refresh the file mtime)."""
+    if not TEXT_CACHE_DIR.exists():
+        return
+    cutoff = datetime.now().timestamp() - max_age_days * 86400
+    for f in TEXT_CACHE_DIR.iterdir():
+        try:
+            if f.stat().st_mtime < cutoff:
+                f.unlink()
+        except OSError:
+            pass
+
+def _text_cache_path(file_path: Path, mtime_ns: int, size: int):
+    key = f"{mtime_ns}-{size}-{file_path.resolve()}"
+    return TEXT_CACHE_DIR / hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest()
+
+@lru_cache(maxsize=512)
+def _read_text_cached(path_str: str, mtime_ns: int, size: int):
+    """
+    Extract text once per (path, mtime_ns, size); a modified file gets a new cache key.
+    PDF text is also persisted under TEXT_CACHE_DIR so unchanged PDFs are not re-parsed across runs.
+    """
+    file_path = Path(path_str)
     suffix = file_path.suffix.lower()
     if suffix == ".pdf":
-        if PdfReader is None:
-            # fallback: return empty or instruct user to install PyPDF2
-            return ""
+        cache_file = _text_cache_path(file_path, mtime_ns, size)
         try:
-            reader = PdfReader(str(file_path))
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() or ""
+            text = cache_file.read_text(encoding="utf-8")
+            os.utime(cache_file)  # LRU marker for sweep_text_cache
             return text
-        except Exception:
-            return ""
+        except OSError:
+            pass
+        text = _extract_pdf_text(file_path)
+        if text:
+            try:
+                TEXT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                # write-then-rename so concurrent scan workers never see a partial entry
+                tmp = cache_file.with_suffix(f".{os.getpid()}.tmp")
+                tmp.write_text(text, encoding="utf-8")
+                os.replace(tmp, cache_file)
+            except OSError:
+                pass
+        return text
     elif suffix == ".txt":
         try:
             return file_path.read_text(encoding="utf-8", errors="ignore")
@@ -101,44 +234,160 @@ def read_text_from_file(file_path: Path):
         # unsupported: return empty
         return ""
 
+def _extract_pdf_text(file_path: Path):
+    if PDFIUM_AVAILABLE:
+        try:
+            pdf = pdfium.PdfDocument(str(file_path))
+            try:
+                text = "".join(page.get_textpage().get_text_range() for page in pdf)
+            finally:
+                pdf.close()
+            # PDFium reports CRLF line breaks; keep "\n" like the PyPDF2 path
+            return text.replace("\r\n", "\n")
+        except Exception:
+            return ""
+    if PdfReader is None:
+        # fallback: return empty or instruct user to install pypdfium2 or PyPDF2
+        return ""
+    return _extract_pdf_text_pypdf2(file_path)
+
+def _extract_pdf_text_pypdf2(file_path: Path):
+    try:
+        reader = PdfReader(str(file_path))
+        parts = []
+        for page in reader.pages:
+            t = page.extract_text()
+            if t:
+                parts.append(t)
+        return "".join(parts)
+    except Exception:
+        return ""
+
 # -----------------------------
 # Hashing & registration
 # -----------------------------
-def compute_file_hash(file_path: Path):
+HASH_CHUNK_SIZE = 1 << 20  # 1 MiB
+HASH_MMAP_THRESHOLD = 100 * (1 << 20)  # files above 100 MiB are hashed through mmap
+
+def _stat_matches(st, entry):
+    return bool(entry) and entry.get("mtime_ns") == st.st_mtime_ns and entry.get("size") == st.st_size and bool(entry.get("hash"))
+
+def stat_matches_entry(file_path: Path, entry: dict = None):
+    """True when entry's stored mtime_ns/size still match the file, i.e. compute_file_hash would return entry["hash"]."""
+    try:
+        return _stat_matches(os.stat(file_path), entry)
+    except OSError:
+        return False
+
+def compute_file_hash(file_path: Path, entry: dict = None):
+    """
+    Fingerprint the raw bytes of a contract file.
+    If `entry` (the contract's metadata record) still matches the file's mtime_ns and size,
+    the stored hash is returned without reading the file at all.
+    Returns None if the file is missing or cannot be read.
+    """
+    file_path = Path(file_path)
     if not file_path.exists():
         return None
-    text = read_text_from_file(file_path)
-    if not text:
+    try:
+        st = os.stat(file_path)
+        if _stat_matches(st, entry):
+            return entry["hash"]
+        h = blake3.blake3() if BLAKE3_AVAILABLE else hashlib.blake2b()
+        with open(file_path, "rb") as f:
+            if st.st_size > HASH_MMAP_THRESHOLD:
+                # large files: hash the mapped pages directly, no per-chunk bytes copies
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    h.update(mm)
+            else:
+                for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                    h.update(chunk)
+    except OSError:
         return None
-    return hashlib.md5(text.encode("utf-8")).hexdigest()
+    return h.hexdigest()
 
-def register_contract_entry(db: dict, file_path: str, extracted_date: str = None, file_hash: str = None, status: str = "Active"):
+def legacy_text_hash(file_path: Path):
+    """
+    Recompute the fingerprint older metadata entries stored: md5 of the extracted text ("" when there is none),
+    with PDFs read through PyPDF2, the extractor that produced those hashes.
+    Returns None when that cannot be reproduced (PyPDF2 not installed).
+    """
+    file_path = Path(file_path)
+    if file_path.suffix.lower() == ".pdf":
+        if PdfReader is None:
+            return None
+        text = _extract_pdf_text_pypdf2(file_path)
+    else:
+        text = read_text_from_file(file_path)
+    return hashlib.md5(text.encode("utf-8")).hexdigest() if text else ""
+
+def file_stat_info(file_path: Path):
+    """Return the (mtime_ns, size) pair stored alongside a contract's hash."""
+    st = os.stat(file_path)
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+def register_contract_entry(db: dict, file_path: str, extracted_date: str = None, file_hash: str = None, status: str = "Active", snapshot_text: str = None):
     """
     Register a new contract entry in metadata DB.
     db: metadata dict (mutated and returned)
     file_path: full path string or relative
+    snapshot_text: already-extracted text (skips re-reading the file)
     """
     p = str(file_path)
     cid = Path(p).stem
+    if snapshot_text is None:
+        snapshot_text = read_text_from_file(Path(p)) if Path(p).exists() else ""
     db[cid] = {
         "file_path": p,
         "date": extracted_date,
         "hash": file_hash,
         "status": status,
         "version": 1,
-        "snapshot_text": read_text_from_file(Path(p))[:4000] if Path(p).exists() else "",
+        "snapshot_text": snapshot_text[:4000],
         "archived_paths": []
     }
+    if Path(p).exists():
+        db[cid].update(file_stat_info(Path(p)))
     return db
 
 # -----------------------------
 # Clause change detection
 # -----------------------------
-def detect_clause_changes(old_text: str, new_text: str):
-    old_lines = set([l.strip() for l in (old_text or "").splitlines() if l.strip()])
-    new_lines = set([l.strip() for l in (new_text or "").splitlines() if l.strip()])
-    added = sorted(list(new_lines - old_lines))
-    removed = sorted(list(old_lines - new_lines))
+# runs between str.splitlines() boundaries (\r, \f, \v, \x1c-\x1e, \x85, \u2028/9 as well as \n)
+_LINE_RE = re.compile(r"[^\n\r\x0b\x0c\x1c-\x1e\x85\u2028\u2029]+")
+
+def _line_set(text: str):
+    """Stripped, non-empty lines of text as a frozenset (single regex pass, no intermediate lists)."""
+    return frozenset(s for s in (m.group(0).strip() for m in _LINE_RE.finditer(text or "")) if s)
+
+def _line_fingerprints(text: str):
+    """Return (stripped non-empty lines, their integer fingerprints)."""
+    lines = [l.strip() for l in (text or "").splitlines() if l.strip()]
+    if XXHASH_AVAILABLE:
+        return lines, [xxhash.xxh64_intdigest(l) for l in lines]
+    return lines, [hash(l) for l in lines]
+
+def detect_clause_changes(old_text: str, new_text: str, mode: str = "sequence"):
+    """
+    Ordered clause diff: lines are fingerprinted to ints and aligned with difflib.SequenceMatcher,
+    so reordered or edited clauses show up where they changed instead of as an unordered set difference.
+    mode="set" gives the cheaper unordered diff (sorted set differences, ignores reordering); it is opt-in,
+    nothing here selects it, and its lines split exactly like str.splitlines() in the original set-based diff.
+    """
+    if mode == "set":
+        old = _line_set(old_text)
+        new = _line_set(new_text)
+        return {"added": sorted(new - old), "removed": sorted(old - new)}
+    old_lines, old_h = _line_fingerprints(old_text)
+    new_lines, new_h = _line_fingerprints(new_text)
+    sm = difflib.SequenceMatcher(a=old_h, b=new_h, autojunk=False)
+    added = []
+    removed = []
+    for tag, i1, i2, j1, j2 in sm.get_opcodes():
+        if tag in ("replace", "insert"):
+            added.extend(new_lines[j1:j2])
+        if tag in ("replace", "delete"):
+            removed.extend(old_lines[i1:i2])
     return {"added": added, "removed": removed}
 
 # -----------------------------
@@ -152,18 +401,18 @@ def save_text_as_pdf_or_txt(text: str, out_path: Path):
             c = canvas.Canvas(str(out_path), pagesize=A4)
             width, height = A4
             margin = 50
-            y = height - margin
-            c.setFont("Helvetica", 10)
-            for line in (text or "").splitlines():
-                # basic wrap
-                chunks = [line[i:i+100] for i in range(0, max(1, len(line)), 100)]
-                for chunk in chunks:
-                    if y < margin + 20:
-                        c.showPage()
-                        y = height - margin
-                        c.setFont("Helvetica", 10)
-                    c.drawString(margin, y, chunk)
-                    y -= 12
+            leading = 12
+            lines_per_page = int((height - 2 * margin - 20) // leading) + 1
+            # basic wrap
+            chunks = [line[i:i+100] for line in (text or "").splitlines() for i in range(0, max(1, len(line)), 100)]
+            # one text object per page instead of one drawString call per line
+            for start in range(0, max(1, len(chunks)), lines_per_page):
+                t = c.beginText(margin, height - margin)
+                t.setFont("Helvetica", 10)
+                t.setLeading(leading)
+                t.textLines(chunks[start:start + lines_per_page], trim=0)
+                c.drawText(t)
+                c.showPage()
             c.save()
             return str(out_path)
         except Exception:
@@ -248,6 +497,20 @@ def build_or_load_faiss(chunks, index_path: Path, rebuild=False):
 # -----------------------------
 # Apply amendment: create new version / archive old
 # -----------------------------
+def _fast_archive(src: Path, dst: Path):
+    """
+    Move src to dst as a metadata-only operation where possible:
+    rename, then hardlink+unlink, and only copy bytes (shutil.move) across filesystems.
+    """
+    try:
+        os.rename(src, dst)
+    except OSError:
+        try:
+            os.link(src, dst)
+            os.unlink(src)
+        except OSError:
+            shutil.move(str(src), str(dst))
+
 def apply_amendment_file(contract_path: str, amendment_text: str, metadata: dict):
     """
     Append amendment_text to the contract and create a new version file under same directory.
@@ -285,14 +548,9 @@ def apply_amendment_file(contract_path: str, amendment_text: str, metadata: dict
     archive_name = f"{p.name}.bak_{ts}"
     archive_path = ARCHIVE_DIR / archive_name
     try:
-        p.replace(archive_path)
+        _fast_archive(p, archive_path)
     except Exception:
-        # if replace fails, try copy
-        try:
-            import shutil
-            shutil.copy2(str(p), str(archive_path))
-        except Exception:
-            pass
+        pass
 
     # update metadata record
     contract_id = Path(new_path).stem